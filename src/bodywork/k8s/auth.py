@@ -104,12 +104,19 @@ def cluster_role_binding_exists(name: str) -> bool:
     return True if name in cluster_role_binding_names else False
 
 
-def delete_cluster_role_binding(name: str) -> None:
+def delete_cluster_role_binding(name: str, ignore_not_found: bool = False) -> None:
     """Delete a cluster-role-binding.
 
     :param name: The name assigned to the cluster-role-binding.
+    :param ignore_not_found: Treat a cluster-role-binding that does not
+        exist as already deleted, defaults to False.
+    :raises kubernetes.client.ApiException: If the API request fails.
     """
-    k8s.RbacAuthorizationV1Api().delete_cluster_role_binding(name=name)
+    try:
+        k8s.RbacAuthorizationV1Api().delete_cluster_role_binding(name=name)
+    except k8s.ApiException as e:
+        if not (ignore_not_found and e.status == 404):
+            raise e
 
 
 def setup_workflow_service_accounts(namespace: str) -> None:
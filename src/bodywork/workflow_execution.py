@@ -22,7 +22,7 @@ from datetime import datetime, timedelta
 from math import ceil
 from pathlib import Path
 from shutil import rmtree
-from typing import Any, cast, List, Tuple
+from typing import Any, cast, List, Set, Tuple
 from kubernetes.client.exceptions import ApiException
 
 import requests
@@ -58,6 +58,8 @@ from .logs import bodywork_log_factory
 
 _log = bodywork_log_factory()
 
+_images_found_on_dockerhub: Set[Tuple[str, str]] = set()
+
 
 def run_workflow(
     repo_url: str,
@@ -467,18 +469,25 @@ def _run_failure_stage(
 def image_exists_on_dockerhub(repo_name: str, tag: str) -> bool:
     """Check DockerHub to see if named Bodywork image exists.
 
+    Images that are found are remembered for the lifetime of the
+    process, so they are only looked-up once. Images that are not found
+    are checked again every time, as they may have been pushed since.
+
     :param repo_name: The name of the DockerHub repository containing
         the Bodywork images.
     :param tag: The specific image tag to check.
     :raises BodyworkDockerImageError: If connection to DockerHub fails.
     :return: Boolean flag for image existence on DockerHub.
     """
+    if (repo_name, tag) in _images_found_on_dockerhub:
+        return True
     dockerhub_url = f"https://hub.docker.com/v2/repositories/{repo_name}/tags/{tag}"
     try:
         session = requests.Session()
         session.mount(dockerhub_url, requests.adapters.HTTPAdapter(max_retries=3))
         response = session.get(dockerhub_url)
         if response.ok:
+            _images_found_on_dockerhub.add((repo_name, tag))
             return True
         else:
             return False
@@ -22,12 +22,18 @@ import re
 import stat
 from pathlib import Path
 from random import randint
+from shutil import rmtree
 from subprocess import PIPE, Popen, STDOUT
-from typing import Iterable
+from tempfile import mkdtemp
+from time import monotonic, sleep
+from typing import Any, Callable, Iterable
 
-from pytest import fixture
-from _pytest.fixtures import FixtureRequest
+import requests
+from filelock import FileLock
+from pytest import Config, fixture, MonkeyPatch, Session, StashKey, TempPathFactory
 from kubernetes import client as k8s_client, config as k8s_config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from subprocess import run
 
 from bodywork.constants import (
@@ -38,7 +44,11 @@ from bodywork.constants import (
 )
 from bodywork.workflow_execution import image_exists_on_dockerhub
 from bodywork.cli.setup_namespace import setup_namespace_with_service_accounts_and_roles
-from bodywork.k8s.auth import load_kubernetes_config, workflow_cluster_role_binding_name
+from bodywork.k8s.auth import (
+    delete_cluster_role_binding,
+    load_kubernetes_config,
+    workflow_cluster_role_binding_name,
+)
 from bodywork.k8s.namespaces import create_namespace, delete_namespace
 
 
@@ -46,6 +56,12 @@ NGINX_INGRESS_CONTROLLER_NAMESPACE = "ingress-nginx"
 NGINX_INGRESS_CONTROLLER_SERVICE_NAME = "ingress-nginx-controller"
 NGINX_INGRESS_CONTROLLER_SERVICE_PORT = 80
 TEST_NAMESPACE = "bodywork-test"
+SHARED_TMP_DIR_KEY = StashKey[Path]()
+SHARED_TMP_DIR_WORKER_INPUT = "bodywork_shared_tmp_dir"
+CLUSTER_SETUP_MARKER = "bodywork-cluster-setup"
+SECRETS_SETUP_MARKER = "bodywork-secrets-setup"
+CLEANUP_LABEL_KEY = "app.kubernetes.io/managed-by"
+CLEANUP_LABEL_VALUE = "bodywork-tests"
 
 
 @fixture(scope="function")
@@ -83,9 +99,9 @@ def test_namespace() -> str:
     return TEST_NAMESPACE
 
 
-@fixture(scope="function")
+@fixture(scope="session")
 def docker_image() -> str:
-    with open(Path("VERSION"), "r") as file:
+    with open(Path(__file__).parents[2] / "VERSION", "r") as file:
         version = file.readlines()[0].replace("\n", "")
     dev_image = f"{BODYWORK_DOCKERHUB_IMAGE_REPO}:{version}-dev"
     if image_exists_on_dockerhub(BODYWORK_DOCKERHUB_IMAGE_REPO, f"{version}-dev"):
@@ -128,14 +144,14 @@ def set_git_ssh_private_key_env_var() -> Iterable[None]:
 
 
 @fixture(scope="function")
-def github_ssh_private_key_file(bodywork_output_dir: Path) -> Path:
+def github_ssh_private_key_file(tmp_path: Path) -> Path:
     try:
         private_key = Path.home() / ".ssh/id_rsa"
         if not private_key.exists():
             private_key = Path.home() / ".ssh/id_ed25519"
         if not private_key.exists():
             raise RuntimeError("cannot locate private SSH key to use for GitHub")
-        file_path = bodywork_output_dir / "id_bodywork"
+        file_path = tmp_path / "id_bodywork"
         with Path(file_path).open(mode="w", newline="\n") as file_handle:
             file_handle.write(private_key.read_text())
         file_path.chmod(mode=stat.S_IREAD)
@@ -198,59 +214,153 @@ def ingress_load_balancer_url() -> Iterable[str]:
 
 
 @fixture(scope="session")
-def setup_cluster(request: FixtureRequest) -> None:
-    load_kubernetes_config()
-    setup_namespace_with_service_accounts_and_roles(BODYWORK_NAMESPACE)
-    create_namespace(TEST_NAMESPACE)
+def http_session() -> Iterable[requests.Session]:
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+    session.mount(
+        "http://",
+        HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries),
+    )
+    yield session
+    session.close()
 
-    def clean_up():
-        delete_namespace(BODYWORK_NAMESPACE)
-        k8s_client.RbacAuthorizationV1Api().delete_cluster_role(
-            BODYWORK_WORKFLOW_CLUSTER_ROLE
-        )
-        k8s_client.RbacAuthorizationV1Api().delete_cluster_role_binding(
-            workflow_cluster_role_binding_name(BODYWORK_NAMESPACE)
-        )
-        delete_namespace(TEST_NAMESPACE)
 
-    request.addfinalizer(clean_up)
+def pytest_configure(config: Config) -> None:
+    """Create a temporary directory to share with all pytest-xdist workers."""
+    if not hasattr(config, "workerinput"):
+        config.stash[SHARED_TMP_DIR_KEY] = Path(mkdtemp(prefix="bodywork-tests-"))
 
 
-@fixture(scope="function")
-def add_secrets(request: FixtureRequest) -> None:
-    run(
-        [
-            "kubectl",
-            "create",
-            "secret",
-            "generic",
-            f"--namespace={BODYWORK_NAMESPACE}",
-            "testsecrets-bodywork-test-project-credentials",
-            "--from-literal=USERNAME=alex",
-            "--from-literal=PASSWORD=alex123",
-        ]
+def pytest_configure_node(node: Any) -> None:
+    """Pass the shared temporary directory on to a pytest-xdist worker."""
+    node.workerinput[SHARED_TMP_DIR_WORKER_INPUT] = str(
+        node.config.stash[SHARED_TMP_DIR_KEY]
     )
 
-    run(
-        [
-            "kubectl",
-            "label",
-            "secret",
-            f"--namespace={BODYWORK_NAMESPACE}",
-            "testsecrets-bodywork-test-project-credentials",
-            "group=testsecrets",
-        ]
+
+def shared_tmp_dir(config: Config) -> Path:
+    """Get a temporary directory that is shared by all pytest-xdist workers."""
+    if hasattr(config, "workerinput"):
+        return Path(config.workerinput[SHARED_TMP_DIR_WORKER_INPUT])
+    return config.stash[SHARED_TMP_DIR_KEY]
+
+
+@fixture(scope="module")
+def isolated_working_dir(tmp_path_factory: TempPathFactory) -> Iterable[Path]:
+    """Run a module's tests from a private working directory.
+
+    Workflows clone projects into ./bodywork_project, which the Git
+    integration tests also use, so modules running on different
+    pytest-xdist workers must not share a working directory.
+    """
+    working_dir = tmp_path_factory.mktemp("cwd")
+    with MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(working_dir)
+        yield working_dir
+
+
+@fixture(scope="session")
+def kubernetes_config() -> None:
+    load_kubernetes_config()
+
+
+def delete_labelled_namespaces(wait: bool, timeout: float = 300) -> None:
+    """Delete the namespaces labelled for clean-up by the tests.
+
+    :param wait: Whether to wait for the namespaces to terminate.
+    :param timeout: Maximum number of seconds to wait for the namespaces
+        to terminate.
+    :raises TimeoutError: If the namespaces still exist after timeout.
+    """
+    selector = f"{CLEANUP_LABEL_KEY}={CLEANUP_LABEL_VALUE}"
+    run(["kubectl", "delete", "namespace", f"--selector={selector}", "--wait=false"])
+    if not wait:
+        return
+    deadline = monotonic() + timeout
+    while k8s_client.CoreV1Api().list_namespace(label_selector=selector).items:
+        if monotonic() > deadline:
+            raise TimeoutError(
+                f"namespaces with label {selector} not deleted within {timeout}s"
+            )
+        sleep(1)
+
+
+@fixture(scope="session")
+def setup_cluster(kubernetes_config: None, pytestconfig: Config) -> None:
+    tmp_dir = shared_tmp_dir(pytestconfig)
+    with FileLock(str(tmp_dir / f"{CLUSTER_SETUP_MARKER}.lock")):
+        setup_marker = tmp_dir / CLUSTER_SETUP_MARKER
+        if not setup_marker.exists():
+            delete_labelled_namespaces(wait=True)
+            setup_namespace_with_service_accounts_and_roles(BODYWORK_NAMESPACE)
+            create_namespace(TEST_NAMESPACE)
+            setup_marker.touch()
+
+
+def pytest_sessionfinish(session: Session) -> None:
+    """Clean-up the cluster once all pytest-xdist workers have finished."""
+    if hasattr(session.config, "workerinput"):
+        return
+    tmp_dir = shared_tmp_dir(session.config)
+    cluster_was_setup = (tmp_dir / CLUSTER_SETUP_MARKER).exists()
+    rmtree(tmp_dir, ignore_errors=True)
+    if not cluster_was_setup:
+        return
+    load_kubernetes_config()
+    delete_labelled_namespaces(wait=False)
+    delete_namespace(BODYWORK_NAMESPACE)
+    k8s_client.RbacAuthorizationV1Api().delete_cluster_role(
+        BODYWORK_WORKFLOW_CLUSTER_ROLE
     )
+    delete_cluster_role_binding(
+        workflow_cluster_role_binding_name(BODYWORK_NAMESPACE), ignore_not_found=True
+    )
+    delete_namespace(TEST_NAMESPACE)
+
+
+@fixture(scope="session")
+def label_namespace_for_cleanup(kubernetes_config: None) -> Callable[[str], None]:
+    def label_namespace(namespace: str) -> None:
+        try:
+            k8s_client.CoreV1Api().patch_namespace(
+                namespace,
+                {"metadata": {"labels": {CLEANUP_LABEL_KEY: CLEANUP_LABEL_VALUE}}},
+            )
+        except k8s_client.rest.ApiException as e:
+            if e.status != 404:
+                raise e
+
+    return label_namespace
+
 
-    def delete_secrets():
+@fixture(scope="session")
+def add_secrets(setup_cluster: None, pytestconfig: Config) -> None:
+    tmp_dir = shared_tmp_dir(pytestconfig)
+    with FileLock(str(tmp_dir / f"{SECRETS_SETUP_MARKER}.lock")):
+        setup_marker = tmp_dir / SECRETS_SETUP_MARKER
+        if setup_marker.exists():
+            return
         run(
             [
                 "kubectl",
-                "delete",
+                "create",
                 "secret",
+                "generic",
                 f"--namespace={BODYWORK_NAMESPACE}",
                 "testsecrets-bodywork-test-project-credentials",
+                "--from-literal=USERNAME=alex",
+                "--from-literal=PASSWORD=alex123",
             ]
         )
 
-    request.addfinalizer(delete_secrets)
+        run(
+            [
+                "kubectl",
+                "label",
+                "secret",
+                f"--namespace={BODYWORK_NAMESPACE}",
+                "testsecrets-bodywork-test-project-credentials",
+                "group=testsecrets",
+            ]
+        )
+        setup_marker.touch()
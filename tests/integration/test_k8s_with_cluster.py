@@ -18,25 +18,26 @@
 Test high-level k8s interaction with a k8s cluster to run stages and a
 demo repo at https://github.com/bodywork-ml/bodywork-test-project.
 """
-import requests
-from re import findall
-from shutil import rmtree
 from subprocess import CalledProcessError, CompletedProcess, run
-from time import sleep
-from pathlib import Path
-
-from pytest import raises, mark
-
-from bodywork.constants import (
-    SSH_DIR_NAME,
-    BODYWORK_NAMESPACE,
-    DEFAULT_SSH_FILE,
-)
-from bodywork.k8s import (
-    delete_namespace,
-    load_kubernetes_config,
-    namespace_exists,
+from time import monotonic, sleep
+from traceback import format_exception
+from typing import Callable, List
+
+from pytest import CaptureFixture, raises, mark
+from requests import Session
+from typer.testing import CliRunner
+
+from bodywork.cli.cli import cli_app
+from bodywork.cli.workflow_jobs import (
+    create_workflow_cronjob,
+    delete_workflow_cronjob,
+    display_cronjobs,
+    update_workflow_cronjob,
 )
+from bodywork.constants import BODYWORK_NAMESPACE
+from bodywork.k8s import delete_namespace, list_workflow_jobs, namespace_exists
+
+pytestmark = mark.usefixtures("isolated_working_dir")
 
 
 def print_completed_process_info(process: CompletedProcess) -> None:
@@ -46,10 +47,49 @@ def print_completed_process_info(process: CompletedProcess) -> None:
     print(process.stdout)
 
 
+def _wait_until(
+    predicate: Callable[[], bool], timeout: float = 30, interval: float = 0.25
+) -> None:
+    """Poll a predicate until it holds, backing-off between attempts.
+
+    :param predicate: Callable that returns True once the expected state
+        has been reached.
+    :param timeout: Maximum number of seconds to wait.
+    :param interval: Initial number of seconds between attempts, which
+        grows by 25% after every attempt, up to a maximum of 1s.
+    :raises TimeoutError: If the predicate does not hold before timeout.
+    """
+    deadline = monotonic() + timeout
+    while not predicate():
+        if monotonic() > deadline:
+            raise TimeoutError(f"condition not satisfied within {timeout}s")
+        sleep(interval)
+        interval = min(interval * 1.25, 1.0)
+
+
+def _invoke_cli(args: List[str]) -> CompletedProcess:
+    """Invoke the bodywork CLI in-process, instead of as a subprocess.
+
+    The traceback of any uncaught exception is appended to the output,
+    as it would be by a subprocess, so that it is not lost when the
+    exception is reduced to a non-zero exit code.
+
+    :param args: The arguments to pass to the bodywork CLI.
+    :return: The CLI's exit code and output as a completed process.
+    """
+    result = CliRunner().invoke(cli_app, args)
+    output = result.stdout
+    if result.exception and not isinstance(result.exception, SystemExit):
+        output += "".join(format_exception(*result.exc_info))
+    return CompletedProcess(["bodywork", *args], result.exit_code, output)
+
+
 @mark.usefixtures("setup_cluster")
 @mark.usefixtures("add_secrets")
 def test_workflow_and_service_management_end_to_end_from_cli(
-    docker_image: str, ingress_load_balancer_url: str
+    docker_image: str,
+    ingress_load_balancer_url: str,
+    http_session: Session,
 ):
     try:
         process = run(
@@ -73,36 +113,29 @@ def test_workflow_and_service_management_end_to_end_from_cli(
         expected_output_7 = "Monitoring k8s jobs"
         expected_output_8 = "Monitoring k8s deployments"
         expected_output_9 = "Deployment successful"
-        assert findall(expected_output_1, process.stdout)
-        assert findall(expected_output_2, process.stdout)
-        assert findall(expected_output_3, process.stdout)
-        assert findall(expected_output_4, process.stdout)
-        assert findall(expected_output_5, process.stdout)
-        assert findall(expected_output_6, process.stdout)
-        assert findall(expected_output_7, process.stdout)
-        assert findall(expected_output_8, process.stdout)
-        assert findall(expected_output_9, process.stdout)
+        assert expected_output_1 in process.stdout
+        assert expected_output_2 in process.stdout
+        assert expected_output_3 in process.stdout
+        assert expected_output_4 in process.stdout
+        assert expected_output_5 in process.stdout
+        assert expected_output_6 in process.stdout
+        assert expected_output_7 in process.stdout
+        assert expected_output_8 in process.stdout
+        assert expected_output_9 in process.stdout
         assert process.returncode == 0
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "update",
                 "deployment",
                 "https://github.com/bodywork-ml/bodywork-test-project",
                 "--branch=master",
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert process.returncode == 0
 
-        process = run(
-            ["bodywork", "get", "deployments"],
-            encoding="utf-8",
-            capture_output=True,
-        )
+        process = _invoke_cli(["get", "deployments"])
 
         assert "stage-3" in process.stdout
         assert "stage-4" in process.stdout
@@ -112,7 +145,7 @@ def test_workflow_and_service_management_end_to_end_from_cli(
             f"http://{ingress_load_balancer_url}/bodywork-test-project/"
             f"/stage-3/v1/predict"
         )
-        response_stage_3 = requests.get(url=stage_3_service_external_url)
+        response_stage_3 = http_session.get(stage_3_service_external_url)
         assert response_stage_3.ok
         assert response_stage_3.json()["y"] == "hello_world"
 
@@ -120,76 +153,63 @@ def test_workflow_and_service_management_end_to_end_from_cli(
             f"http://{ingress_load_balancer_url}/bodywork-test-project/"
             f"/stage-4/v2/predict"
         )
-        response_stage_4 = requests.get(url=stage_4_service_external_url)
+        response_stage_4 = http_session.get(stage_4_service_external_url)
         assert response_stage_4.status_code == 404
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "delete",
                 "deployment",
                 "bodywork-test-project",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert "deployment=bodywork-test-project deleted." in process.stdout
         assert process.returncode == 0
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "get",
                 "deployments",
                 "bodywork-test-project",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert "No deployments found" in process.stdout
         assert process.returncode == 0
 
     except Exception:
         print_completed_process_info(process)
-        try:
-            # only required if test fails before `bodywork delete deployment`
+        raise
+    finally:
+        # only required if test fails before `bodywork delete deployment`
+        if namespace_exists("bodywork-test-project"):
             delete_namespace("bodywork-test-project")
-        except Exception:
-            pass
-        assert False
 
 
 @mark.usefixtures("setup_cluster")
 def test_services_from_previous_deployments_are_deleted(docker_image: str):
     try:
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "https://github.com/bodywork-ml/test-single-service-project.git",
                 "--branch=test-two-services",
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert process.returncode == 0
         assert "Deployment successful" in process.stdout
 
         sleep(5)
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "update",
                 "deployment",
                 "https://github.com/bodywork-ml/test-single-service-project.git",
                 "--branch=master",
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert process.returncode == 0
         assert "Deployment successful" in process.stdout
@@ -198,55 +218,47 @@ def test_services_from_previous_deployments_are_deleted(docker_image: str):
             in process.stdout
         )
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "get",
                 "deployment",
                 "bodywork-test-single-service-project",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert process.returncode == 0
         assert "stage-1" in process.stdout
         assert "stage-2" not in process.stdout
 
     finally:
-        load_kubernetes_config()
-        delete_namespace("bodywork-test-single-service-project")
+        if namespace_exists("bodywork-test-single-service-project"):
+            delete_namespace("bodywork-test-single-service-project")
 
 
 @mark.usefixtures("setup_cluster")
 def test_workflow_will_clean_up_jobs_and_rollback_new_deployments_that_yield_errors(
     docker_image: str,
+    label_namespace_for_cleanup: Callable[[str], None],
 ):
     try:
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "https://github.com/bodywork-ml/bodywork-rollback-deployment-test-project",  # noqa
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         expected_output_0 = "Deleted k8s job for stage = stage-1"
         assert expected_output_0 in process.stdout
         assert process.returncode == 0
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "update",
                 "deployment",
                 "https://github.com/bodywork-ml/bodywork-rollback-deployment-test-project",  # noqa
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         expected_output_1 = "Deployments failed to roll-out successfully"
         expected_output_2 = "Rolled-back k8s deployment for stage = stage-2"
@@ -256,25 +268,23 @@ def test_workflow_will_clean_up_jobs_and_rollback_new_deployments_that_yield_err
 
     except Exception:
         print_completed_process_info(process)
-        assert False
+        raise
     finally:
-        load_kubernetes_config()
-        delete_namespace("bodywork-rollback-deployment-test-project")
+        label_namespace_for_cleanup("bodywork-rollback-deployment-test-project")
 
 
 @mark.usefixtures("setup_cluster")
-def test_deploy_will_run_failure_stage_on_workflow_failure(docker_image: str):
+def test_deploy_will_run_failure_stage_on_workflow_failure(
+    docker_image: str, label_namespace_for_cleanup: Callable[[str], None]
+):
     try:
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "https://github.com/bodywork-ml/bodywork-failing-test-project",
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
 
         expected_output_0 = "Deployment failed --> "
@@ -286,49 +296,45 @@ def test_deploy_will_run_failure_stage_on_workflow_failure(docker_image: str):
         assert process.returncode == 1
     except Exception:
         print_completed_process_info(process)
-        assert False
+        raise
     finally:
-        load_kubernetes_config()
-        delete_namespace("bodywork-failing-test-project")
+        label_namespace_for_cleanup("bodywork-failing-test-project")
 
 
 @mark.usefixtures("setup_cluster")
-def test_deployment_will_not_run_if_bodywork_docker_image_cannot_be_located():
+@mark.parametrize(
+    "image, expected_output",
+    [
+        (
+            "bad:bodyworkml/bodywork-core:0.0.0",
+            "Invalid Docker image specified: bad:bodyworkml/bodywork-core:0.0.0",
+        ),
+        (
+            "bodyworkml/bodywork-not-an-image:latest",
+            "Cannot locate bodyworkml/bodywork-not-an-image:latest on DockerHub",
+        ),
+    ],
+)
+def test_deployment_will_not_run_if_bodywork_docker_image_cannot_be_located(
+    image: str,
+    expected_output: str,
+):
+    # these cases must run one after the other - run_workflow clones the project
+    # into ./bodywork_project and creates its namespace before the image is checked
     try:
-        bad_image = "bad:bodyworkml/bodywork-core:0.0.0"
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "https://github.com/bodywork-ml/bodywork-test-project",
-                f"--bodywork-image={bad_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert f"Invalid Docker image specified: {bad_image}" in process.stdout
-        assert process.returncode == 1
-
-        process = run(
-            [
-                "bodywork",
-                "create",
-                "deployment",
-                "https://github.com/bodywork-ml/bodywork-test-project",
-                "--bodywork-image=bodyworkml/bodywork-not-an-image:latest",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert (
-            "Cannot locate bodyworkml/bodywork-not-an-image:latest on DockerHub"
-            in process.stdout
+                f"--bodywork-image={image}",
+            ]
         )
+        assert expected_output in process.stdout
         assert process.returncode == 1
     finally:
-        load_kubernetes_config()
-        delete_namespace("bodywork-test-project")
+        if namespace_exists("bodywork-test-project"):
+            delete_namespace("bodywork-test-project")
 
 
 def test_deployment_command_unsuccessful_raises_exception(test_namespace: str):
@@ -345,73 +351,46 @@ def test_deployment_command_unsuccessful_raises_exception(test_namespace: str):
 
 
 @mark.usefixtures("setup_cluster")
-def test_cli_cronjob_handler_crud():
+def test_cronjob_handler_crud(capsys: CaptureFixture):
     try:
-        process = run(
-            [
-                "bodywork",
-                "create",
-                "cronjob",
-                "https://github.com/bodywork-ml/bodywork-test-project",
-                "--branch=master",
-                "--name=bodywork-test-project",
-                "--schedule=0,30 * * * *",
-                "--retries=2",
-                "--history-limit=1",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert "Created cronjob=bodywork-test-project" in process.stdout
-        assert process.returncode == 0
-
-        process = run(
-            [
-                "bodywork",
-                "update",
-                "cronjob",
-                "https://github.com/bodywork-ml/bodywork-test-project",
-                "--branch=main",
-                "--name=bodywork-test-project",
-                "--schedule=0,0 1 * * *",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert "Updated cronjob=bodywork-test-project" in process.stdout
-        assert process.returncode == 0
-
-        process = run(
-            ["bodywork", "get", "cronjob", "bodywork-test-project"],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert "bodywork-test-project" in process.stdout
-        assert "0,0 1 * * *" in process.stdout
-        assert "https://github.com/bodywork-ml/bodywork-test-project" in process.stdout
-        assert "main" in process.stdout
-        assert process.returncode == 0
-
-        process = run(
-            [
-                "bodywork",
-                "delete",
-                "cronjob",
-                "bodywork-test-project",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert "Deleted cronjob=bodywork-test-project" in process.stdout
-        assert process.returncode == 0
-
-        process = run(
-            ["bodywork", "get", "cronjob"],
-            encoding="utf-8",
-            capture_output=True,
-        )
-        assert "" in process.stdout
-        assert process.returncode == 0
+        create_workflow_cronjob(
+            BODYWORK_NAMESPACE,
+            "0,30 * * * *",
+            "bodywork-test-project",
+            "https://github.com/bodywork-ml/bodywork-test-project",
+            "master",
+            retries=2,
+            workflow_job_history_limit=1,
+        )
+        stdout = capsys.readouterr().out
+        assert "Created cronjob=bodywork-test-project" in stdout
+
+        update_workflow_cronjob(
+            BODYWORK_NAMESPACE,
+            "bodywork-test-project",
+            "0,0 1 * * *",
+            "https://github.com/bodywork-ml/bodywork-test-project",
+            "main",
+            retries=1,
+            workflow_job_history_limit=1,
+        )
+        stdout = capsys.readouterr().out
+        assert "Updated cronjob=bodywork-test-project" in stdout
+
+        display_cronjobs(BODYWORK_NAMESPACE, "bodywork-test-project")
+        stdout = capsys.readouterr().out
+        assert "bodywork-test-project" in stdout
+        assert "0,0 1 * * *" in stdout
+        assert "https://github.com/bodywork-ml/bodywork-test-project" in stdout
+        assert "main" in stdout
+
+        delete_workflow_cronjob(BODYWORK_NAMESPACE, "bodywork-test-project")
+        stdout = capsys.readouterr().out
+        assert "Deleted cronjob=bodywork-test-project" in stdout
+
+        display_cronjobs(BODYWORK_NAMESPACE)
+        stdout = capsys.readouterr().out
+        assert "bodywork-test-project" not in stdout
     finally:
         run(
             [
@@ -449,12 +428,10 @@ def test_deployment_with_ssh_github_connectivity_from_file(
         assert process.returncode == 0
     except Exception:
         print_completed_process_info(process)
-        assert False
+        raise
     finally:
-        load_kubernetes_config()
         if namespace_exists("bodywork-test-batch-job-project"):
             delete_namespace("bodywork-test-batch-job-project")
-        rmtree(SSH_DIR_NAME, ignore_errors=True)
 
 
 @mark.usefixtures("setup_cluster")
@@ -462,53 +439,48 @@ def test_deployment_of_remote_workflows(docker_image: str):
     try:
         job_name = "foo"
 
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "https://github.com/bodywork-ml/test-single-service-project.git",
                 f"--bodywork-image={docker_image}",
                 "--async",
                 f"--async-job-name={job_name}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
 
         assert process.returncode == 0
         assert f"Created workflow-job=async-workflow-{job_name}" in process.stdout
 
-        sleep(20)
-
-        process = run(
-            ["bodywork", "get", "deployments", "--async"],
-            encoding="utf-8",
-            capture_output=True,
-        )
+        process = _invoke_cli(["get", "deployments", "--async"])
         assert process.returncode == 0
         assert job_name in process.stdout
 
-        process = run(
-            [
-                "bodywork",
-                "get",
-                "deployment",
-                "--async",
-                f"--logs=async-workflow-{job_name}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
+        def workflow_logs_available() -> bool:
+            nonlocal process
+            process = _invoke_cli(
+                [
+                    "get",
+                    "deployment",
+                    "--async",
+                    f"--logs=async-workflow-{job_name}",
+                ]
+            )
+            return process.returncode == 0 and (
+                "Deployment successful" in process.stdout
+                or "Deployment failed" in process.stdout
+            )
+
+        _wait_until(workflow_logs_available, timeout=300)
         assert process.returncode == 0
-        assert type(process.stdout) is str and len(process.stdout) != 0
+        assert "Deployment successful" in process.stdout
         assert "ERROR" not in process.stdout
 
     except Exception:
         print_completed_process_info(process)
-        assert False
+        raise
     finally:
-        load_kubernetes_config()
         run(
             [
                 "kubectl",
@@ -516,11 +488,11 @@ def test_deployment_of_remote_workflows(docker_image: str):
                 "job",
                 f"async-workflow-{job_name}",
                 f"--namespace={BODYWORK_NAMESPACE}",
+                "--cascade=foreground",
             ]
         )
         if namespace_exists("bodywork-test-single-service-project"):
             delete_namespace("bodywork-test-single-service-project")
-        rmtree(SSH_DIR_NAME, ignore_errors=True)
 
 
 @mark.usefixtures("setup_cluster")
@@ -530,55 +502,51 @@ def test_remote_deployment_with_ssh_github_connectivity(
 ):
     job_name = "test-remote-ssh-workflow"
     try:
-        process = run(
+        process = _invoke_cli(
             [
-                "bodywork",
                 "create",
                 "deployment",
                 "git@github.com:bodywork-ml/test-bodywork-batch-job-project.git",
                 "--branch=master",
                 "--async",
                 f"--async-job-name={job_name}",
-                f"--ssh={Path.home() / f'.ssh/{DEFAULT_SSH_FILE}'}",
+                f"--ssh={github_ssh_private_key_file}",
                 "--group=bodywork-tests",
                 f"--bodywork-image={docker_image}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
+            ]
         )
         assert process.returncode == 0
         assert f"Created workflow-job=async-workflow-{job_name}" in process.stdout
 
-        sleep(5)
+        workflow_job_name = f"async-workflow-{job_name}"
 
-        process = run(
-            [
-                "bodywork",
-                "get",
-                "deployment",
-                f"{job_name}",
-            ],
-            encoding="utf-8",
-            capture_output=True,
-        )
+        def deployment_completed() -> bool:
+            job_info = list_workflow_jobs(BODYWORK_NAMESPACE, workflow_job_name)
+            return any(
+                info["succeeded"] or info["failed"] for info in job_info.values()
+            )
+
+        _wait_until(deployment_completed, timeout=300)
+        job_info = list_workflow_jobs(BODYWORK_NAMESPACE, workflow_job_name)
+        assert job_info[workflow_job_name]["succeeded"] is True
+
+        process = _invoke_cli(["get", "deployment", "--async"])
         assert process.returncode == 0
-        assert type(process.stdout) is str and len(process.stdout) != 0
-        assert "ERROR" or "error" not in process.stdout
+        assert f"run ID = {workflow_job_name}" in process.stdout
 
     except Exception:
         print_completed_process_info(process)
-        assert False
+        raise
     finally:
-        load_kubernetes_config()
         run(
             [
                 "kubectl",
                 "delete",
                 "job",
-                f"{job_name}",
+                f"async-workflow-{job_name}",
                 f"--namespace={BODYWORK_NAMESPACE}",
+                "--cascade=foreground",
             ]
         )
         if namespace_exists("bodywork-test-batch-job-project"):
             delete_namespace("bodywork-test-batch-job-project")
-        rmtree(SSH_DIR_NAME, ignore_errors=True)
@@ -34,27 +34,59 @@ def test_replicate_secrets_in_namespace(test_namespace: str):
 
 
 @mark.usefixtures("setup_cluster")
-@mark.usefixtures("add_secrets")
 def test_update_secret():
-    process_one = run(
-        [
-            "bodywork",
-            "update",
-            "secret",
-            "bodywork-test-project-credentials",
-            "--group=testsecrets",
-            "--data",
-            "PASSWORD=updated",
-        ],
-        encoding="utf-8",
-        capture_output=True,
-    )
-
-    assert process_one.returncode == 0
-    assert (
-        "Updated secret=bodywork-test-project-credentials in group=testsecrets"
-        in process_one.stdout
-    )
+    try:
+        process_one = run(
+            [
+                "bodywork",
+                "create",
+                "secret",
+                "update-test-credentials",
+                "--group=testupdatesecrets",
+                "--data",
+                "PASSWORD=alex123",
+            ],
+            encoding="utf-8",
+            capture_output=True,
+        )
+
+        assert process_one.returncode == 0
+        assert (
+            "Created secret=update-test-credentials in group=testupdatesecrets"
+            in process_one.stdout
+        )
+
+        process_two = run(
+            [
+                "bodywork",
+                "update",
+                "secret",
+                "update-test-credentials",
+                "--group=testupdatesecrets",
+                "--data",
+                "PASSWORD=updated",
+            ],
+            encoding="utf-8",
+            capture_output=True,
+        )
+
+        assert process_two.returncode == 0
+        assert (
+            "Updated secret=update-test-credentials in group=testupdatesecrets"
+            in process_two.stdout
+        )
+    finally:
+        run(
+            [
+                "bodywork",
+                "delete",
+                "secret",
+                "update-test-credentials",
+                "--group=testupdatesecrets",
+            ],
+            encoding="utf-8",
+            capture_output=True,
+        )
 
 
 @mark.usefixtures("setup_cluster")
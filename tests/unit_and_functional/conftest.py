@@ -22,6 +22,15 @@ import os
 from typing import Iterable, Dict, Any
 from pytest import fixture
 
+from bodywork.workflow_execution import _images_found_on_dockerhub
+
+
+@fixture(scope="function", autouse=True)
+def clear_dockerhub_image_cache() -> Iterable[None]:
+    _images_found_on_dockerhub.clear()
+    yield None
+    _images_found_on_dockerhub.clear()
+
 
 @fixture(scope="function")
 def k8s_env_vars() -> Iterable[bool]:
@@ -23,6 +23,7 @@ from unittest.mock import MagicMock, patch
 from typing import Iterable
 
 import kubernetes
+from pytest import raises
 
 from bodywork.constants import (
     BODYWORK_WORKFLOW_CLUSTER_ROLE,
@@ -105,6 +106,24 @@ def test_delete_cluster_role_binding_deletes_role_bindings(
     )
 
 
+@patch("kubernetes.client.RbacAuthorizationV1Api")
+def test_delete_cluster_role_binding_can_ignore_missing_role_bindings(
+    mock_k8s_rbac_api: MagicMock,
+):
+    mock_k8s_rbac_api().delete_cluster_role_binding.side_effect = (
+        kubernetes.client.ApiException(status=404)
+    )
+    delete_cluster_role_binding("xx-the-namespace", ignore_not_found=True)
+    with raises(kubernetes.client.ApiException):
+        delete_cluster_role_binding("xx-the-namespace")
+
+    mock_k8s_rbac_api().delete_cluster_role_binding.side_effect = (
+        kubernetes.client.ApiException(status=500)
+    )
+    with raises(kubernetes.client.ApiException):
+        delete_cluster_role_binding("xx-the-namespace", ignore_not_found=True)
+
+
 @patch("kubernetes.client.RbacAuthorizationV1Api")
 def test_cluster_role_binding_exists_exists_identifies_existing_cluster_role_binding(
     mock_k8s_rbac_api: MagicMock,
@@ -56,7 +56,9 @@ from bodywork.config import BodyworkConfig
 def test_image_exists_on_dockerhub_handles_connection_error(
     mock_requests_session: MagicMock,
 ):
-    mock_requests_session().get.side_effect = requests.exceptions.ConnectionError
+    mock_requests_session.return_value.get.side_effect = (
+        requests.exceptions.ConnectionError
+    )
     with raises(BodyworkDockerImageError, match="cannot connect to"):
         image_exists_on_dockerhub("bodywork-ml/bodywork-core", "latest")
 
@@ -65,15 +67,42 @@ def test_image_exists_on_dockerhub_handles_connection_error(
 def test_image_exists_on_dockerhub_handles_correctly_identifies_image_repos(
     mock_requests_session: MagicMock,
 ):
-    mock_requests_session().get.return_value = requests.Response()
+    mock_get = mock_requests_session.return_value.get
+    mock_get.return_value = requests.Response()
 
-    mock_requests_session().get.return_value.status_code = 200
+    mock_get.return_value.status_code = 200
     assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "v1") is True
 
-    mock_requests_session().get.return_value.status_code = 404
+    mock_get.return_value.status_code = 404
     assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "x") is False
 
 
+@patch("requests.Session")
+def test_image_exists_on_dockerhub_caches_results(mock_requests_session: MagicMock):
+    mock_get = mock_requests_session.return_value.get
+    mock_get.return_value = requests.Response()
+    mock_get.return_value.status_code = 200
+
+    assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "v1") is True
+    assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "v1") is True
+    mock_get.assert_called_once()
+
+
+@patch("requests.Session")
+def test_image_exists_on_dockerhub_does_not_cache_missing_images(
+    mock_requests_session: MagicMock,
+):
+    mock_get = mock_requests_session.return_value.get
+    mock_get.return_value = requests.Response()
+
+    mock_get.return_value.status_code = 404
+    assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "v1") is False
+
+    mock_get.return_value.status_code = 200
+    assert image_exists_on_dockerhub("bodywork-ml/bodywork-core", "v1") is True
+    assert mock_get.call_count == 2
+
+
 def test_parse_dockerhub_image_string_raises_exception_for_invalid_strings():
     with raises(
         BodyworkDockerImageError,